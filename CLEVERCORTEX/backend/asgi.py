@@ -0,0 +1,91 @@
+# Single ASGI service hosting the quiz (main.py), summary (app.py) and study-plan (server.py) APIs.
+# Every route keeps its current path; the services share one model client, PDF extraction layer
+# and set of caches. Run with: gunicorn -c gunicorn.conf.py asgi:app
+#
+# Threads per worker process, to size against memory and model rate limits:
+# - EXECUTOR_THREADS: the shared executor behind run_blocking() and batches (model calls, PDF parsing, SQLite)
+# - WSGI_THREADS: Flask requests of the study-plan API (a2wsgi's own pool; without a2wsgi, anyio's)
+# - anyio's thread pool (40 by default): Starlette background tasks and sync dependencies
+# - one thread per streaming WebSocket quiz, up to WS_MAX_CONCURRENT_GENERATIONS
+from contextlib import asynccontextmanager
+import asyncio
+import logging
+import os
+from fastapi import FastAPI
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.routing import APIRoute, APIWebSocketRoute
+import uvicorn
+import main as quiz_service
+import app as summary_service
+import server as study_plan_service
+from common import executor, start_warm_up
+from precompute import precomputer
+from responses import CompressionMiddleware, json_response_class
+
+logger = logging.getLogger(__name__)
+
+STUDY_PLAN_PREFIX = "/api/"  # Flask routes of server.py
+WSGI_THREADS = int(os.getenv("WSGI_THREADS", "16"))
+SHUTDOWN_TIMEOUT = float(os.getenv("GRACEFUL_TIMEOUT", "30"))  # Seconds to let running jobs finish
+
+@asynccontextmanager
+async def lifespan(api: FastAPI):
+    start_warm_up()
+    yield
+    logger.info("Shutting down: waiting for running jobs to finish")
+    # Waiting happens off the event loop, and only for as long as the graceful timeout allows
+    try:
+        await asyncio.wait_for(
+            asyncio.to_thread(executor.shutdown, wait=True, cancel_futures=True),
+            timeout=SHUTDOWN_TIMEOUT
+        )
+    except asyncio.TimeoutError:
+        logger.warning(f"Jobs still running after {SHUTDOWN_TIMEOUT}s; shutting down anyway")
+
+api = FastAPI(title="CleverCortex API", lifespan=lifespan, default_response_class=json_response_class())
+
+api.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+
+@api.middleware("http")
+async def track_interactive_requests(request, call_next):
+    # Background precomputation holds off while requests are being served
+    with precomputer.interactive():
+        return await call_next(request)
+
+# Quiz routes come first, so its "/" and "/health" win over the summary service's
+for service in (quiz_service, summary_service):
+    for route in service.app.router.routes:
+        if isinstance(route, (APIRoute, APIWebSocketRoute)):
+            api.router.routes.append(route)
+
+try:
+    from a2wsgi import WSGIMiddleware
+    study_plan_api = WSGIMiddleware(study_plan_service.app, workers=WSGI_THREADS)
+except ImportError:
+    from starlette.middleware.wsgi import WSGIMiddleware
+    study_plan_api = WSGIMiddleware(study_plan_service.app)
+
+async def dispatch(scope, receive, send):
+    """Send /api/* HTTP requests to the Flask study-plan app and everything else to FastAPI"""
+    if scope["type"] == "http" and scope["path"].startswith(STUDY_PLAN_PREFIX):
+        await study_plan_api(scope, receive, send)
+    else:
+        await api(scope, receive, send)
+
+# Compression wraps both frameworks; responses Flask already compressed pass through untouched
+app = CompressionMiddleware(dispatch)
+
+if __name__ == "__main__":
+    uvicorn.run(
+        "asgi:app",
+        host=os.getenv("HOST", "0.0.0.0"),
+        port=int(os.getenv("PORT", "8000")),
+        workers=int(os.getenv("WORKERS", "1")),
+        timeout_graceful_shutdown=int(os.getenv("GRACEFUL_TIMEOUT", "30"))
+    )
@@ -0,0 +1,69 @@
+import asyncio
+import json
+import os
+from concurrent.futures import FIRST_COMPLETED, wait
+from typing import Any, Callable, Dict, Iterator, List, Tuple
+from common import executor, run_blocking
+from precompute import precomputer
+from responses import orjson
+
+# Batch uploads: many chapter PDFs in one multipart request
+BATCH_MAX_FILES = int(os.getenv("BATCH_MAX_FILES", "30"))
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))  # Files processed at once per batch
+
+def ndjson(record: Dict[str, Any]) -> bytes:
+    """Encode one streamed record as a line of newline-delimited JSON"""
+    if orjson is not None:
+        return orjson.dumps(record, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_APPEND_NEWLINE)
+    return (json.dumps(record) + "\n").encode("utf-8")
+
+def run_item(worker: Callable[[str, bytes], Dict[str, Any]], index: int, filename: str, data: bytes) -> Dict[str, Any]:
+    """Process one file, turning any failure into an error record so the rest of the batch continues"""
+    try:
+        return {"type": "result", "index": index, "filename": filename, "status": "success", **worker(filename, data)}
+    except Exception as e:
+        detail = getattr(e, "detail", None) or str(e)
+        return {"type": "result", "index": index, "filename": filename, "status": "error", "error": detail}
+
+async def stream_batch(files: List[Tuple[str, bytes]], worker: Callable[[str, bytes], Dict[str, Any]]):
+    """Run worker(filename, data) for each file on the shared executor, yielding records as they finish"""
+    slots = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+    async def run(index: int, filename: str, data: bytes) -> Dict[str, Any]:
+        async with slots:
+            return await run_blocking(run_item, worker, index, filename, data)
+
+    with precomputer.interactive():
+        tasks = [asyncio.create_task(run(i, filename, data)) for i, (filename, data) in enumerate(files)]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            # Client went away: drop files that have not started yet
+            for task in tasks:
+                task.cancel()
+
+def iter_batch(files: List[Tuple[str, bytes]], worker: Callable[[str, bytes], Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+    """Blocking counterpart of stream_batch for the Flask service"""
+    pending = iter(enumerate(files))
+    running = set()
+
+    def submit_next() -> None:
+        item = next(pending, None)
+        if item is not None:
+            index, (filename, data) = item
+            running.add(executor.submit(run_item, worker, index, filename, data))
+
+    with precomputer.interactive():
+        for _ in range(BATCH_CONCURRENCY):
+            submit_next()
+        try:
+            while running:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    running.discard(future)
+                    yield future.result()
+                    submit_next()
+        finally:
+            for future in running:
+                future.cancel()
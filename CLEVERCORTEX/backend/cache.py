@@ -0,0 +1,248 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+logger = logging.getLogger(__name__)
+
+SHARED_CACHE_PATH = os.getenv("SHARED_CACHE_PATH", "shared_cache.db")
+SHARED_CACHE_MAX_BYTES = int(os.getenv("SHARED_CACHE_MAX_MB", "512")) * 1024 * 1024
+SHARED_CACHE_MMAP_BYTES = int(os.getenv("SHARED_CACHE_MMAP_MB", "256")) * 1024 * 1024
+MEMORY_CACHE_MAX_BYTES = int(os.getenv("MEMORY_CACHE_MAX_MB", "32")) * 1024 * 1024  # Per worker process
+
+def document_fingerprint(text: str) -> str:
+    """Fingerprint a document by its text, ignoring whitespace differences"""
+    normalized = " ".join(text.split())
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+def artifact_key(kind: str, doc_hash: str, user_level: str) -> str:
+    """Cache key for a generated artifact (summary, study plan, ...) of a document"""
+    return f"{kind}:{doc_hash}:{user_level}"
+
+def value_size(value: Any) -> int:
+    """Approximate memory held by a cached value: exact for strings, the JSON length for anything else"""
+    if isinstance(value, (str, bytes)):
+        return sys.getsizeof(value)
+    return len(json.dumps(value))
+
+class MemoryCache:
+    """Thread-safe in-process LRU cache bounded by the approximate size of its values"""
+
+    def __init__(self, max_bytes: int = MEMORY_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._entries: "OrderedDict[str, Any]" = OrderedDict()
+        self._sizes = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str, default: Optional[Any] = None) -> Any:
+        with self._lock:
+            if key not in self._entries:
+                return default
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def set(self, key: str, value: Any) -> None:
+        size = value_size(value)
+        with self._lock:
+            self._remove(key)
+            if size > self.max_bytes:
+                return
+            self._entries[key] = value
+            self._sizes[key] = size
+            self.total_bytes += size
+            while self.total_bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, key: str) -> None:
+        if key in self._entries:
+            del self._entries[key]
+            self.total_bytes -= self._sizes.pop(key)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._remove(key)
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            return key in self._entries
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+class SQLiteCache:
+    """Cache shared by every process on the host, stored in a SQLite database in WAL mode"""
+
+    # Errors (a lock held past the busy timeout, a full disk, ...) fail open: reads miss and writes are skipped
+
+    def __init__(self, path: str = SHARED_CACHE_PATH, max_bytes: int = SHARED_CACHE_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = None
+        self._pid = None
+
+    def _connection(self) -> sqlite3.Connection:
+        # Connections must not cross a fork, so each worker process opens its own
+        if self._conn is None or self._pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5.0, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(f"PRAGMA mmap_size={SHARED_CACHE_MMAP_BYTES}")
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS cache_entries (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    accessed_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_cache_entries_accessed ON cache_entries (accessed_at);
+                CREATE TABLE IF NOT EXISTS cache_meta (
+                    name TEXT PRIMARY KEY,
+                    value INTEGER NOT NULL
+                );
+                -- Running total of entry sizes, kept up to date by every write
+                INSERT OR IGNORE INTO cache_meta (name, value)
+                    SELECT 'total_size', COALESCE(SUM(size), 0) FROM cache_entries;
+            """)
+            self._conn = conn
+            self._pid = os.getpid()
+        return self._conn
+
+    def get(self, key: str, default: Optional[Any] = None) -> Any:
+        now = time.time()
+        try:
+            with self._lock:
+                conn = self._connection()
+                row = conn.execute("SELECT value, accessed_at FROM cache_entries WHERE key = ?", (key,)).fetchone()
+                if row is None:
+                    return default
+                # Refresh the LRU timestamp at most once a minute to keep reads cheap
+                if now - row[1] > 60:
+                    with conn:
+                        conn.execute("UPDATE cache_entries SET accessed_at = ? WHERE key = ?", (now, key))
+        except sqlite3.Error as e:
+            logger.error(f"Shared cache read failed: {e}")
+            return default
+        return json.loads(row[0])
+
+    def set(self, key: str, value: Any) -> None:
+        payload = json.dumps(value)
+        size = len(payload.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        try:
+            with self._lock:
+                conn = self._connection()
+                # One transaction: readers in other processes see either the old entry or the new one
+                with conn:
+                    conn.execute("BEGIN IMMEDIATE")
+                    old = conn.execute("SELECT size FROM cache_entries WHERE key = ?", (key,)).fetchone()
+                    conn.execute(
+                        "INSERT OR REPLACE INTO cache_entries (key, value, size, accessed_at) VALUES (?, ?, ?, ?)",
+                        (key, payload, size, time.time())
+                    )
+                    self._add_to_total(conn, size - (old[0] if old else 0))
+                    self._evict(conn)
+        except sqlite3.Error as e:
+            logger.error(f"Shared cache write failed: {e}")
+
+    def _add_to_total(self, conn: sqlite3.Connection, delta: int) -> int:
+        conn.execute("UPDATE cache_meta SET value = value + ? WHERE name = 'total_size'", (delta,))
+        return conn.execute("SELECT value FROM cache_meta WHERE name = 'total_size'").fetchone()[0]
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        """Drop least recently used entries until the cache is back under 90% of its size limit"""
+        total = self._add_to_total(conn, 0)
+        if total <= self.max_bytes:
+            return
+        target = int(self.max_bytes * 0.9)
+        evicted = []
+        freed = 0
+        for key, size in conn.execute("SELECT key, size FROM cache_entries ORDER BY accessed_at"):
+            if total - freed <= target:
+                break
+            evicted.append((key,))
+            freed += size
+        conn.executemany("DELETE FROM cache_entries WHERE key = ?", evicted)
+        self._add_to_total(conn, -freed)
+
+    def delete(self, key: str) -> None:
+        try:
+            with self._lock:
+                conn = self._connection()
+                with conn:
+                    conn.execute("BEGIN IMMEDIATE")
+                    old = conn.execute("SELECT size FROM cache_entries WHERE key = ?", (key,)).fetchone()
+                    if old:
+                        conn.execute("DELETE FROM cache_entries WHERE key = ?", (key,))
+                        self._add_to_total(conn, -old[0])
+        except sqlite3.Error as e:
+            logger.error(f"Shared cache delete failed: {e}")
+
+    def __contains__(self, key: str) -> bool:
+        try:
+            with self._lock:
+                return self._connection().execute(
+                    "SELECT 1 FROM cache_entries WHERE key = ?", (key,)
+                ).fetchone() is not None
+        except sqlite3.Error as e:
+            logger.error(f"Shared cache read failed: {e}")
+            return False
+
+    def __len__(self) -> int:
+        try:
+            with self._lock:
+                return self._connection().execute("SELECT COUNT(*) FROM cache_entries").fetchone()[0]
+        except sqlite3.Error as e:
+            logger.error(f"Shared cache read failed: {e}")
+            return 0
+
+class TieredCache:
+    """In-process LRU in front of the cross-process SQLite cache, with the same get/set API"""
+
+    def __init__(self, local: MemoryCache, shared: SQLiteCache):
+        self.local = local
+        self.shared = shared
+
+    def get(self, key: str, default: Optional[Any] = None) -> Any:
+        value = self.local.get(key, _MISSING)
+        if value is _MISSING:
+            value = self.shared.get(key, _MISSING)
+            if value is _MISSING:
+                return default
+            self.local.set(key, value)
+        return value
+
+    def set(self, key: str, value: Any) -> None:
+        self.shared.set(key, value)
+        self.local.set(key, value)
+
+    def delete(self, key: str) -> None:
+        self.shared.delete(key)
+        self.local.delete(key)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.local or key in self.shared
+
+    def __len__(self) -> int:
+        return len(self.shared)
+
+_MISSING = object()
+_shared_cache: Optional[TieredCache] = None
+_shared_cache_lock = threading.Lock()
+
+def get_shared_cache() -> TieredCache:
+    """Process-wide cache for extracted text, model responses and generated artifacts"""
+    global _shared_cache
+    with _shared_cache_lock:
+        if _shared_cache is None:
+            _shared_cache = TieredCache(MemoryCache(), SQLiteCache())
+        return _shared_cache
@@ -0,0 +1,138 @@
+import asyncio
+import hashlib
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Dict
+from cache import get_shared_cache
+
+# PyMuPDF and google.generativeai are slow to import, so they are loaded on first use or by warm_up()
+
+logger = logging.getLogger(__name__)
+
+def seconds_since_process_start() -> float:
+    """Age of this process from the kernel's start time, so imports of the web stack count too"""
+    try:
+        with open("/proc/self/stat") as f:
+            # Fields after the parenthesised command name; starttime (field 22) is in clock ticks since boot
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        return max(0.0, uptime - start_ticks / os.sysconf("SC_CLK_TCK"))
+    except (OSError, ValueError, IndexError):
+        return 0.0  # No procfs: measured from this import instead
+
+PROCESS_STARTED = time.monotonic() - seconds_since_process_start()
+
+# Shared by the quiz, summary and study-plan services
+GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-1.5-flash")
+MODEL_WARM_UP_TIMEOUT = float(os.getenv("MODEL_WARM_UP_TIMEOUT", "10"))  # Seconds
+EXECUTOR_THREADS = int(os.getenv("EXECUTOR_THREADS", "32"))  # run_blocking() and batches: model calls, PDF parsing, SQLite
+
+executor = ThreadPoolExecutor(max_workers=EXECUTOR_THREADS, thread_name_prefix="worker")
+
+_model = None
+_model_lock = threading.Lock()
+
+readiness: Dict[str, Any] = {
+    "ready": False,
+    "extractor": False,
+    "model": False,
+    "start_to_ready_seconds": None,
+    "error": None
+}
+_warm_up_thread = None
+_warm_up_lock = threading.Lock()
+
+def get_model():
+    """Return the process-wide Gemini model client, configuring it on first use"""
+    global _model
+    with _model_lock:
+        if _model is None:
+            if not GEMINI_API_KEY:
+                raise RuntimeError("GEMINI_API_KEY is not set")
+            import google.generativeai as genai
+            genai.configure(api_key=GEMINI_API_KEY)
+            _model = genai.GenerativeModel(GEMINI_MODEL)
+        return _model
+
+def generate_text(prompt: str) -> str:
+    """Generate a model response, reusing the cached one for a prompt seen before"""
+    key = "llm:" + hashlib.sha256(f"{GEMINI_MODEL}\n{prompt}".encode("utf-8")).hexdigest()
+    cache = get_shared_cache()
+    text = cache.get(key)
+    if text is None:
+        text = get_model().generate_content(prompt).text
+        cache.set(key, text)
+    return text
+
+def extract_text_from_pdf(pdf_path: str) -> str:
+    """Extract text from a PDF file on disk"""
+    with open(pdf_path, "rb") as f:
+        return extract_text_from_bytes(f.read())
+
+def extract_text_from_bytes(data: bytes) -> str:
+    """Extract text from an uploaded PDF without writing it to disk"""
+    key = "text:" + hashlib.sha256(data).hexdigest()
+    cache = get_shared_cache()
+    text = cache.get(key)
+    if text is None:
+        import fitz  # PyMuPDF
+        with fitz.open(stream=data, filetype="pdf") as doc:
+            text = "\n".join(page.get_text("text") for page in doc)
+        cache.set(key, text)
+    return text
+
+async def run_blocking(func, *args, **kwargs):
+    """Run a blocking call on the shared executor without stalling the event loop"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, partial(func, *args, **kwargs))
+
+def warm_up() -> None:
+    """Load the PDF and model libraries and connect to the model before traffic arrives"""
+    try:
+        import fitz  # PyMuPDF
+        # Round-trip a blank PDF so the extractor's native code paths are loaded too
+        with fitz.open() as doc:
+            doc.new_page()
+            sample = doc.tobytes()
+        with fitz.open(stream=sample, filetype="pdf") as doc:
+            for page in doc:
+                page.get_text("text")
+        readiness["extractor"] = True
+
+        model = get_model()
+        readiness["model"] = True
+        try:
+            # A cheap authenticated call opens the connection the first quiz would otherwise pay for
+            model.count_tokens("warm up", request_options={"timeout": MODEL_WARM_UP_TIMEOUT})
+        except Exception as e:
+            # Best effort: an unreachable API or a library change must not keep the service unready
+            logger.warning(f"Model connection warm-up failed: {e}")
+
+        readiness["start_to_ready_seconds"] = round(time.monotonic() - PROCESS_STARTED, 3)
+        readiness["error"] = None
+        readiness["ready"] = True
+        logger.info(f"Ready {readiness['start_to_ready_seconds']}s after process start")
+    except Exception as e:
+        readiness["error"] = str(e)
+        logger.error(f"Warm-up failed: {e}")
+
+def start_warm_up() -> None:
+    """Run warm_up() in the background, once per process unless a previous attempt failed"""
+    global _warm_up_thread
+    with _warm_up_lock:
+        if readiness["ready"] or (_warm_up_thread is not None and _warm_up_thread.is_alive()):
+            return
+        _warm_up_thread = threading.Thread(target=warm_up, name="warm-up", daemon=True)
+        _warm_up_thread.start()
+
+def readiness_status() -> Dict[str, Any]:
+    """Readiness report for /ready; a failed warm-up is retried on each check"""
+    if not readiness["ready"]:
+        start_warm_up()
+    return dict(readiness)
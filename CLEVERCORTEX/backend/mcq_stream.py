@@ -0,0 +1,40 @@
+import json
+from question_bank import is_valid_question
+
+class MCQStreamParser:
+    """Incrementally pulls complete question objects out of a streamed JSON response"""
+
+    def __init__(self):
+        self._buffer = ""
+        self._pos = 0
+        self._in_string = False
+        self._escaped = False
+        self._object_starts = []
+
+    def feed(self, chunk: str) -> list:
+        """Consume a chunk of model output and return any questions it completed"""
+        self._buffer += chunk
+        found = []
+        while self._pos < len(self._buffer):
+            ch = self._buffer[self._pos]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif ch == "\\":
+                    self._escaped = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch == "{":
+                self._object_starts.append(self._pos)
+            elif ch == "}" and self._object_starts:
+                start = self._object_starts.pop()
+                try:
+                    obj = json.loads(self._buffer[start:self._pos + 1])
+                except ValueError:
+                    obj = None
+                if is_valid_question(obj):
+                    found.append(obj)
+            self._pos += 1
+        return found
@@ -0,0 +1,310 @@
+import itertools
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional, Tuple
+from cache import SHARED_CACHE_PATH
+
+logger = logging.getLogger(__name__)
+
+LEVELS = ["Basic", "Intermediate", "Advanced"]
+
+# Precomputation of the other difficulty levels, and speculative prefetch (prefetch.py), are opt-in
+PRECOMPUTE_ENABLED = os.getenv("PRECOMPUTE_LEVELS", "0").lower() in ("1", "true", "yes")
+PREFETCH_ENABLED = os.getenv("PREFETCH_ENABLED", "0").lower() in ("1", "true", "yes")
+# Shared by all worker processes on the host, and charged only for jobs that actually called the model
+PRECOMPUTE_MAX_JOBS_PER_HOUR = int(os.getenv("PRECOMPUTE_MAX_JOBS_PER_HOUR", "60"))
+PRECOMPUTE_IDLE_SECONDS = float(os.getenv("PRECOMPUTE_IDLE_SECONDS", "2"))  # Quiet period after interactive traffic
+PRECOMPUTE_QUEUE_SIZE = int(os.getenv("PRECOMPUTE_QUEUE_SIZE", "100"))
+PRECOMPUTE_DB_PATH = os.getenv("PRECOMPUTE_DB_PATH", SHARED_CACHE_PATH)
+
+ACTIVITY_HEARTBEAT_SECONDS = 5.0  # Each worker republishes its traffic at least this often
+ACTIVITY_STALE_SECONDS = 30.0  # A worker silent for longer has exited and is ignored
+SHARED_POLL_SECONDS = 1.0  # How often a waiting job rechecks the other workers
+
+class LocalLedger:
+    """Hourly job budget of a single process, for running without the shared store"""
+
+    shared = False
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._job_times: deque = deque()
+        self._slots = itertools.count()
+
+    def reserve(self, idle_seconds: float, max_jobs_per_hour: int) -> Tuple[Optional[int], float]:
+        """Take a budget slot, or return how long to wait before trying again"""
+        now = time.monotonic()
+        with self._lock:
+            while self._job_times and now - self._job_times[0][0] > 3600:
+                self._job_times.popleft()
+            if self._job_times and len(self._job_times) >= max_jobs_per_hour:
+                return None, 3600 - (now - self._job_times[0][0])
+            slot = next(self._slots)
+            self._job_times.append((now, slot))
+            return slot, 0.0
+
+    def release(self, slot: int) -> None:
+        """Give back the slot of a job that found its result already stored"""
+        with self._lock:
+            self._job_times = deque(entry for entry in self._job_times if entry[1] != slot)
+
+    def publish(self, active_requests: int, last_activity: float) -> None:
+        pass
+
+class SharedLedger:
+    """Hourly job budget and interactive traffic of every worker process on the host, kept in SQLite"""
+
+    shared = True
+
+    def __init__(self, path: str = PRECOMPUTE_DB_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = None
+        self._pid = None
+
+    def _connection(self) -> sqlite3.Connection:
+        # Connections must not cross a fork, so each worker process opens its own
+        if self._conn is None or self._pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5.0, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS precompute_runs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    ran_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_precompute_runs_ran_at ON precompute_runs (ran_at);
+                CREATE TABLE IF NOT EXISTS worker_activity (
+                    pid INTEGER PRIMARY KEY,
+                    active_requests INTEGER NOT NULL,
+                    last_activity REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                );
+            """)
+            self._conn = conn
+            self._pid = os.getpid()
+        return self._conn
+
+    def reserve(self, idle_seconds: float, max_jobs_per_hour: int) -> Tuple[Optional[int], float]:
+        """Take a budget slot once every other worker is idle, or return how long to wait"""
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                # One transaction, so two workers cannot both take the last slot
+                conn.execute("BEGIN IMMEDIATE")
+                rows = conn.execute(
+                    "SELECT active_requests, last_activity FROM worker_activity WHERE pid != ? AND updated_at > ?",
+                    (os.getpid(), now - ACTIVITY_STALE_SECONDS)
+                ).fetchall()
+                if any(active > 0 for active, _ in rows):
+                    return None, SHARED_POLL_SECONDS
+                latest = max((last for _, last in rows), default=0.0)
+                if now - latest < idle_seconds:
+                    return None, idle_seconds - (now - latest)
+
+                conn.execute("DELETE FROM precompute_runs WHERE ran_at <= ?", (now - 3600,))
+                used, oldest = conn.execute("SELECT COUNT(*), MIN(ran_at) FROM precompute_runs").fetchone()
+                if used >= max_jobs_per_hour:
+                    return None, max(SHARED_POLL_SECONDS, 3600 - (now - oldest))
+                cursor = conn.execute("INSERT INTO precompute_runs (ran_at) VALUES (?)", (now,))
+                return cursor.lastrowid, 0.0
+
+    def release(self, slot: int) -> None:
+        """Give back the slot of a job that found its result already stored"""
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                conn.execute("DELETE FROM precompute_runs WHERE id = ?", (slot,))
+
+    def publish(self, active_requests: int, last_activity: float) -> None:
+        """Record this worker's traffic so the others hold their jobs while it is busy"""
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO worker_activity (pid, active_requests, last_activity, updated_at) "
+                    "VALUES (?, ?, ?, ?)",
+                    (os.getpid(), active_requests, last_activity, time.time())
+                )
+
+class Precomputer:
+    """Runs low-priority background jobs one at a time, only while no interactive request is in flight"""
+
+    def __init__(
+        self,
+        max_jobs_per_hour: int = PRECOMPUTE_MAX_JOBS_PER_HOUR,
+        idle_seconds: float = PRECOMPUTE_IDLE_SECONDS,
+        max_queue: int = PRECOMPUTE_QUEUE_SIZE,
+        ledger=None
+    ):
+        self.max_jobs_per_hour = max_jobs_per_hour
+        self.idle_seconds = idle_seconds
+        self.ledger = ledger if ledger is not None else LocalLedger()
+        self._queue: queue.PriorityQueue = queue.PriorityQueue(maxsize=max_queue)
+        self._sequence = itertools.count()
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._active_requests = 0
+        self._last_activity = 0.0
+        self._worker = None
+        self._publisher = None
+        self._stats = {"submitted": 0, "completed": 0, "failed": 0, "dropped": 0, "cancelled": 0}
+
+    def begin_interactive(self) -> None:
+        with self._lock:
+            self._active_requests += 1
+            if self.ledger.shared and self._publisher is None:
+                self._publisher = threading.Thread(target=self._publish_activity, name="precompute-activity", daemon=True)
+                self._publisher.start()
+            self._changed.notify_all()
+
+    def end_interactive(self) -> None:
+        with self._lock:
+            self._active_requests -= 1
+            self._last_activity = time.monotonic()
+            self._changed.notify_all()
+
+    @contextmanager
+    def interactive(self):
+        """Mark an interactive request so background jobs hold off until it finishes"""
+        self.begin_interactive()
+        try:
+            yield
+        finally:
+            self.end_interactive()
+
+    def submit(
+        self,
+        key: str,
+        job: Callable[[], Optional[bool]],
+        priority: int = 10,
+        ttl: Optional[float] = None,
+        max_active_requests: Optional[int] = None
+    ) -> bool:
+        """Queue a job unless one with the same key is pending; lower priority numbers run first"""
+        # A job returns False when it found its result already stored, so it is not charged to the budget
+        # Jobs that cannot start within their ttl are cancelled; busy services refuse them outright
+        deadline = time.monotonic() + ttl if ttl is not None else None
+        with self._lock:
+            if key in self._pending:
+                return False
+            if self.max_jobs_per_hour <= 0:
+                # A zero budget turns precomputation off
+                self._stats["dropped"] += 1
+                return False
+            if max_active_requests is not None and self._active_requests > max_active_requests:
+                self._stats["dropped"] += 1
+                return False
+            try:
+                self._queue.put_nowait((priority, next(self._sequence), key, job, deadline))
+            except queue.Full:
+                self._stats["dropped"] += 1
+                return False
+            self._pending.add(key)
+            self._stats["submitted"] += 1
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name="precompute", daemon=True)
+                self._worker.start()
+        return True
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {**self._stats, "queued": len(self._pending), "active_requests": self._active_requests}
+
+    def _publish_activity(self) -> None:
+        """Keep this worker's traffic visible to the others, on every change and as a heartbeat"""
+        published = None
+        while True:
+            with self._lock:
+                state = (self._active_requests, self._last_activity)
+                if state == published:
+                    self._changed.wait(ACTIVITY_HEARTBEAT_SECONDS)
+                    state = (self._active_requests, self._last_activity)
+            # Other processes compare against the wall clock
+            last_activity = time.time() - (time.monotonic() - state[1]) if state[1] else 0.0
+            try:
+                self.ledger.publish(state[0], last_activity)
+                published = state
+            except sqlite3.Error as e:
+                logger.error(f"Publishing worker activity failed: {e}")
+            time.sleep(0.2)  # Coalesce bursts of short requests into one write
+
+    def _wait_for_turn(self, deadline: Optional[float] = None) -> Optional[int]:
+        """Block until every worker is idle and a budget slot is reserved; None if the job's deadline passes first"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if deadline is not None and now >= deadline:
+                    return None
+                if self._active_requests > 0:
+                    timeout = None
+                elif now - self._last_activity < self.idle_seconds:
+                    timeout = self.idle_seconds - (now - self._last_activity)
+                else:
+                    timeout = 0.0
+                if timeout != 0.0:
+                    if deadline is not None:
+                        timeout = deadline - now if timeout is None else min(timeout, deadline - now)
+                    self._changed.wait(timeout)
+                    continue
+
+            # This worker is idle; the other workers and the budget are checked outside the lock
+            try:
+                slot, timeout = self.ledger.reserve(self.idle_seconds, self.max_jobs_per_hour)
+            except sqlite3.Error as e:
+                logger.error(f"Reserving a precompute slot failed: {e}")
+                slot, timeout = None, SHARED_POLL_SECONDS
+            if slot is not None:
+                return slot
+
+            with self._lock:
+                if deadline is not None:
+                    timeout = min(timeout, deadline - time.monotonic())
+                if timeout > 0:
+                    self._changed.wait(timeout)
+
+    def _run(self) -> None:
+        while True:
+            _, _, key, job, deadline = self._queue.get()
+            outcome, slot = "failed", None
+            try:
+                slot = self._wait_for_turn(deadline)
+                if slot is None:
+                    outcome = "cancelled"
+                else:
+                    charged = job() is not False
+                    outcome = "completed"
+                    if not charged:
+                        self.ledger.release(slot)
+            except Exception as e:
+                # Nothing may end this loop: it is the only thread draining the queue
+                logger.error(f"Precompute job {key} failed: {e}")
+            finally:
+                with self._lock:
+                    self._pending.discard(key)
+                    self._stats[outcome] += 1
+
+# The shared ledger is only needed, and its activity only published, when background jobs are enabled
+precomputer = Precomputer(ledger=SharedLedger() if PRECOMPUTE_ENABLED or PREFETCH_ENABLED else None)
+
+def precompute_other_levels(
+    kind: str,
+    doc_hash: str,
+    user_level: str,
+    produce: Callable[[str], bool],
+    needed: Callable[[str], bool]
+) -> None:
+    """Queue generation of a document's artifact for the other levels that do not have it yet"""
+    if not PRECOMPUTE_ENABLED:
+        return
+    for level in LEVELS:
+        if level != user_level and needed(level):
+            precomputer.submit(f"{kind}:{doc_hash}:{level}", lambda level=level: produce(level))
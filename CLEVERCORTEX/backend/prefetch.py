@@ -0,0 +1,147 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from functools import partial
+from typing import Any, Callable, Dict, Optional
+from cache import SHARED_CACHE_PATH, artifact_key
+from precompute import PREFETCH_ENABLED, precomputer
+
+logger = logging.getLogger(__name__)
+
+PREFETCH_PRIORITY = 20  # Runs after level precomputation for documents already in use
+PREFETCH_MAX_ACTIVE_REQUESTS = int(os.getenv("PREFETCH_MAX_ACTIVE_REQUESTS", "4"))  # Skip prefetch when busier
+PREFETCH_JOB_TTL = float(os.getenv("PREFETCH_JOB_TTL", "600"))  # Seconds a queued prefetch may wait before it is cancelled
+PREFETCH_WASTE_AFTER = float(os.getenv("PREFETCH_WASTE_AFTER", str(24 * 3600)))  # Unused this long counts as waste
+PREFETCH_DB_PATH = os.getenv("PREFETCH_DB_PATH", SHARED_CACHE_PATH)
+
+# Artifact kind -> producer registered by the service that owns it. Producers take (text, doc_hash, user_level)
+# and return True if they generated something rather than finding it already stored. A standalone service only
+# knows its own kind; the unified service (asgi.py) loads all three, so every kind can be prefetched there
+PRODUCERS: Dict[str, Callable[[str, str, str], bool]] = {}
+
+def register_producer(kind: str, produce: Callable[[str, str, str], bool]) -> None:
+    PRODUCERS[kind] = produce
+
+class PrefetchTracker:
+    """Records first sight of documents and how prefetched artifacts get used, across all services"""
+
+    def __init__(self, path: str = PREFETCH_DB_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = None
+        self._pid = None
+
+    def _connection(self) -> sqlite3.Connection:
+        # Connections must not cross a fork, so each worker process opens its own
+        if self._conn is None or self._pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5.0, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS seen_documents (
+                    doc_hash TEXT PRIMARY KEY,
+                    first_seen REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS prefetched (
+                    key TEXT PRIMARY KEY,
+                    created_at REAL NOT NULL,
+                    used_at REAL
+                );
+            """)
+            self._conn = conn
+            self._pid = os.getpid()
+        return self._conn
+
+    def first_sight(self, doc_hash: str) -> bool:
+        """Register a document, returning True only the first time any service sees it"""
+        with self._lock, self._connection() as conn:
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO seen_documents (doc_hash, first_seen) VALUES (?, ?)",
+                (doc_hash, time.time())
+            )
+            return cursor.rowcount == 1
+
+    def record_prefetch(self, key: str) -> None:
+        with self._lock, self._connection() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO prefetched (key, created_at, used_at) VALUES (?, ?, NULL)",
+                (key, time.time())
+            )
+
+    def record_use(self, key: str) -> None:
+        with self._lock, self._connection() as conn:
+            conn.execute(
+                "UPDATE prefetched SET used_at = ? WHERE key = ? AND used_at IS NULL",
+                (time.time(), key)
+            )
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit and waste ratios of prefetched artifacts"""
+        waste_cutoff = time.time() - PREFETCH_WASTE_AFTER
+        with self._lock:
+            conn = self._connection()
+            prefetched, hits, wasted = conn.execute(
+                "SELECT COUNT(*), "
+                "COUNT(used_at), "
+                "SUM(CASE WHEN used_at IS NULL AND created_at < ? THEN 1 ELSE 0 END) "
+                "FROM prefetched",
+                (waste_cutoff,)
+            ).fetchone()
+        wasted = wasted or 0
+        return {
+            "prefetched": prefetched,
+            "hits": hits,
+            "wasted": wasted,
+            "pending": prefetched - hits - wasted,
+            "hit_ratio": round(hits / prefetched, 3) if prefetched else 0.0,
+            "waste_ratio": round(wasted / prefetched, 3) if prefetched else 0.0
+        }
+
+_tracker: Optional[PrefetchTracker] = None
+_tracker_lock = threading.Lock()
+
+def get_tracker() -> PrefetchTracker:
+    global _tracker
+    with _tracker_lock:
+        if _tracker is None:
+            _tracker = PrefetchTracker()
+        return _tracker
+
+def _prefetch(kind: str, text: str, doc_hash: str, user_level: str) -> bool:
+    generated = PRODUCERS[kind](text, doc_hash, user_level)
+    if generated:
+        get_tracker().record_prefetch(artifact_key(kind, doc_hash, user_level))
+    return generated
+
+def on_document(kind: str, text: str, doc_hash: str, user_level: str) -> None:
+    """Upload hook: the first time a document is seen, queue the other services' artifacts for it"""
+    if not PREFETCH_ENABLED:
+        return
+    others = [other for other in PRODUCERS if other != kind]
+    if not others or not get_tracker().first_sight(doc_hash):
+        return
+    for other in others:
+        precomputer.submit(
+            f"prefetch:{artifact_key(other, doc_hash, user_level)}",
+            partial(_prefetch, other, text, doc_hash, user_level),
+            priority=PREFETCH_PRIORITY,
+            ttl=PREFETCH_JOB_TTL,
+            max_active_requests=PREFETCH_MAX_ACTIVE_REQUESTS
+        )
+
+def record_use(kind: str, doc_hash: str, user_level: str) -> None:
+    """Note that an artifact was served, turning a matching prefetch into a hit"""
+    if not PREFETCH_ENABLED:
+        return
+    try:
+        get_tracker().record_use(artifact_key(kind, doc_hash, user_level))
+    except sqlite3.Error as e:
+        logger.error(f"Recording prefetch use failed: {e}")
+
+def prefetch_stats() -> Dict[str, Any]:
+    return {
+        "enabled": PREFETCH_ENABLED,
+        **(get_tracker().stats() if PREFETCH_ENABLED else {}),
+        "jobs": precomputer.stats()
+    }
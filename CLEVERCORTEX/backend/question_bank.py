@@ -0,0 +1,196 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+from cache import document_fingerprint
+
+DEFAULT_DB_PATH = os.getenv("QUESTION_BANK_PATH", "question_bank.db")
+MAX_DOCUMENTS = int(os.getenv("QUESTION_BANK_MAX_DOCUMENTS", "500"))  # Least recently used beyond this are dropped
+SEEN_RETENTION_DAYS = float(os.getenv("QUESTION_BANK_SEEN_DAYS", "30"))  # Older seen records are forgotten
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    doc_hash TEXT PRIMARY KEY,
+    text TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    used_at REAL NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_documents_used_at ON documents (used_at);
+
+CREATE TABLE IF NOT EXISTS questions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    doc_hash TEXT NOT NULL,
+    level TEXT NOT NULL,
+    fingerprint TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    UNIQUE (doc_hash, level, fingerprint)
+);
+
+CREATE INDEX IF NOT EXISTS idx_questions_doc_level ON questions (doc_hash, level);
+
+CREATE TABLE IF NOT EXISTS seen (
+    client_id TEXT NOT NULL,
+    question_id INTEGER NOT NULL,
+    seen_at REAL NOT NULL,
+    PRIMARY KEY (client_id, question_id)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS idx_seen_seen_at ON seen (seen_at);
+"""
+
+def question_fingerprint(question: Dict) -> str:
+    """Fingerprint a question so regenerated duplicates are stored only once"""
+    normalized = " ".join(str(question.get("question", "")).lower().split())
+    return hashlib.sha1(normalized.encode("utf-8")).hexdigest()
+
+def is_valid_question(question: Dict) -> bool:
+    """Check a generated MCQ has the fields the quiz screens rely on"""
+    return (
+        isinstance(question, dict)
+        and isinstance(question.get("question"), str)
+        and question["question"].strip() != ""
+        and isinstance(question.get("options"), list)
+        and len(question["options"]) >= 2
+        and question.get("answer") is not None
+    )
+
+class QuestionBank:
+    """Local store of generated MCQs keyed by document fingerprint and difficulty level"""
+
+    def __init__(self, path: str = DEFAULT_DB_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = None
+        self._pid = None
+
+    def _connection(self) -> sqlite3.Connection:
+        # Connections must not cross a fork, so each worker process opens its own
+        if self._conn is None or self._pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5.0, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(documents)")]
+            if columns and "used_at" not in columns:
+                # Banks created before documents were expired
+                with conn:
+                    conn.execute("ALTER TABLE documents ADD COLUMN used_at REAL NOT NULL DEFAULT 0")
+                    conn.execute("UPDATE documents SET used_at = created_at")
+            conn.executescript(SCHEMA)
+            self._conn = conn
+            self._pid = os.getpid()
+        return self._conn
+
+    def add_document(self, text: str) -> str:
+        """Register a document's text and return its fingerprint"""
+        doc_hash = document_fingerprint(text)
+        now = time.time()
+        with self._lock, self._connection() as conn:
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO documents (doc_hash, text, created_at, used_at) VALUES (?, ?, ?, ?)",
+                (doc_hash, text, now, now)
+            )
+            if cursor.rowcount == 1:
+                self._prune(conn, now)
+            else:
+                conn.execute("UPDATE documents SET used_at = ? WHERE doc_hash = ?", (now, doc_hash))
+        return doc_hash
+
+    def _prune(self, conn: sqlite3.Connection, now: float) -> None:
+        """Drop the least recently used documents beyond the cap, with their questions, and old seen records"""
+        stale = conn.execute(
+            "SELECT doc_hash FROM documents ORDER BY used_at DESC LIMIT -1 OFFSET ?", (MAX_DOCUMENTS,)
+        ).fetchall()
+        for (doc_hash,) in stale:
+            conn.execute(
+                "DELETE FROM seen WHERE question_id IN (SELECT id FROM questions WHERE doc_hash = ?)", (doc_hash,)
+            )
+            conn.execute("DELETE FROM questions WHERE doc_hash = ?", (doc_hash,))
+            conn.execute("DELETE FROM documents WHERE doc_hash = ?", (doc_hash,))
+        conn.execute("DELETE FROM seen WHERE seen_at < ?", (now - SEEN_RETENTION_DAYS * 86400,))
+
+    def get_document(self, doc_hash: str) -> Optional[str]:
+        """Return the stored text for a document fingerprint, if known"""
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute(
+                "SELECT text FROM documents WHERE doc_hash = ?", (doc_hash,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def add_questions(self, doc_hash: str, level: str, questions: List[Dict]) -> int:
+        """Store questions for a document and level, returning how many were new"""
+        now = time.time()
+        rows = [
+            (doc_hash, level, question_fingerprint(q), json.dumps(q), now)
+            for q in questions if is_valid_question(q)
+        ]
+        with self._lock, self._connection() as conn:
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO questions (doc_hash, level, fingerprint, payload, created_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                rows
+            )
+            return conn.total_changes - before
+
+    def count(self, doc_hash: str, level: str, client_id: Optional[str] = None) -> int:
+        """Count questions for a document and level, excluding ones the client has seen"""
+        query = "SELECT COUNT(*) FROM questions q WHERE q.doc_hash = ? AND q.level = ?"
+        params: list = [doc_hash, level]
+        if client_id:
+            query += " AND NOT EXISTS (SELECT 1 FROM seen s WHERE s.client_id = ? AND s.question_id = q.id)"
+            params.append(client_id)
+        with self._lock:
+            conn = self._connection()
+            return conn.execute(query, params).fetchone()[0]
+
+    def question_texts(self, doc_hash: str, level: str, limit: int = 50) -> List[str]:
+        """Return the most recent question texts, used to steer generation away from repeats"""
+        with self._lock:
+            conn = self._connection()
+            rows = conn.execute(
+                "SELECT payload FROM questions WHERE doc_hash = ? AND level = ? ORDER BY id DESC LIMIT ?",
+                (doc_hash, level, limit)
+            ).fetchall()
+        return [json.loads(row[0])["question"] for row in rows]
+
+    def sample(self, doc_hash: str, level: str, n: int, client_id: Optional[str] = None) -> List[Dict]:
+        """Pick up to n questions in random order, skipping the ones the client has seen"""
+        query = "SELECT q.payload FROM questions q WHERE q.doc_hash = ? AND q.level = ?"
+        params: list = [doc_hash, level]
+        if client_id:
+            query += " AND NOT EXISTS (SELECT 1 FROM seen s WHERE s.client_id = ? AND s.question_id = q.id)"
+            params.append(client_id)
+        query += " ORDER BY RANDOM() LIMIT ?"
+        params.append(n)
+
+        with self._lock:
+            conn = self._connection()
+            rows = conn.execute(query, params).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def mark_seen(self, doc_hash: str, level: str, client_id: str, questions: List[Dict]) -> None:
+        """Record that a client was served the given questions"""
+        fingerprints = [question_fingerprint(q) for q in questions]
+        if not client_id or not fingerprints:
+            return
+        placeholders = ",".join("?" * len(fingerprints))
+        now = time.time()
+        with self._lock, self._connection() as conn:
+            conn.execute(
+                f"INSERT OR IGNORE INTO seen (client_id, question_id, seen_at) "
+                f"SELECT ?, id, ? FROM questions WHERE doc_hash = ? AND level = ? "
+                f"AND fingerprint IN ({placeholders})",
+                [client_id, now, doc_hash, level, *fingerprints]
+            )
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
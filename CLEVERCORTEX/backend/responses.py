@@ -0,0 +1,134 @@
+import os
+import zlib
+from typing import Optional
+
+# Optional accelerators: orjson for JSON encoding, brotli for better compression than gzip
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))  # Bytes; smaller bodies are sent as is
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "5"))
+
+# Content types that are already compressed
+INCOMPRESSIBLE_TYPES = (b"image/", b"video/", b"audio/", b"application/zip", b"application/pdf")
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """Pick brotli or gzip from an Accept-Encoding header, or None if neither is acceptable"""
+    accepted = set()
+    for part in accept_encoding.lower().split(","):
+        name, *params = [p.strip() for p in part.split(";")]
+        quality = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if quality > 0:
+            accepted.add(name)
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted:
+        return "gzip"
+    return None
+
+class Compressor:
+    """Incremental brotli/gzip compressor that can flush after every chunk of a streamed body"""
+
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "br":
+            self._compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        else:
+            self._compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)  # 31: gzip container
+
+    def compress(self, data: bytes, final: bool = False) -> bytes:
+        if self.encoding == "br":
+            out = self._compressor.process(data)
+            return out + (self._compressor.finish() if final else self._compressor.flush())
+        out = self._compressor.compress(data)
+        return out + self._compressor.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+def compress(data: bytes, encoding: str) -> bytes:
+    return Compressor(encoding).compress(data, final=True)
+
+class CompressionMiddleware:
+    """ASGI middleware compressing HTTP responses with the negotiated encoding above a minimum size"""
+
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        accept_encoding = b""
+        for name, value in scope.get("headers", []):
+            if name == b"accept-encoding":
+                accept_encoding = value
+        encoding = choose_encoding(accept_encoding.decode("latin-1"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        compressor = None
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal start_message, compressor, passthrough
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+            if compressor is None:
+                headers = list(start_message.get("headers", []))
+                content_type = next((v for k, v in headers if k.lower() == b"content-type"), b"")
+                already_encoded = any(k.lower() == b"content-encoding" for k, _ in headers)
+                too_small = not more_body and len(body) < self.minimum_size
+                if already_encoded or too_small or content_type.startswith(INCOMPRESSIBLE_TYPES):
+                    passthrough = True
+                    await send(start_message)
+                    await send(message)
+                    return
+
+                # Streamed bodies are compressed chunk by chunk, so their length is unknown up front
+                compressor = Compressor(encoding)
+                data = compressor.compress(body, final=not more_body)
+                headers = [(k, v) for k, v in headers if k.lower() != b"content-length"]
+                headers += [(b"content-encoding", encoding.encode()), (b"vary", b"Accept-Encoding")]
+                if not more_body:
+                    headers.append((b"content-length", str(len(data)).encode()))
+                await send({**start_message, "headers": headers})
+                await send({"type": "http.response.body", "body": data, "more_body": more_body})
+                return
+
+            await send({
+                "type": "http.response.body",
+                "body": compressor.compress(body, final=not more_body),
+                "more_body": more_body
+            })
+
+        await self.app(scope, receive, send_compressed)
+
+def json_response_class():
+    """FastAPI response class for JSON bodies: orjson-backed when orjson is installed"""
+    from fastapi.responses import JSONResponse, ORJSONResponse
+    return ORJSONResponse if orjson is not None else JSONResponse
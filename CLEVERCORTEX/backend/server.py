@@ -1,20 +1,50 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
-import fitz  # PyMuPDF
-import google.generativeai as genai
 import os
 from datetime import datetime, timedelta
+from functools import partial
 import tempfile
 import logging
 import re
 from werkzeug.utils import secure_filename
 from typing import Dict, List, Any
+from batch import BATCH_MAX_FILES, iter_batch, ndjson
+from common import (
+    extract_text_from_bytes as read_pdf_bytes,
+    extract_text_from_pdf as read_pdf_text,
+    get_model,
+    readiness_status,
+    start_warm_up
+)
+from responses import COMPRESSION_MIN_SIZE, choose_encoding, compress, orjson
+from cache import artifact_key, document_fingerprint, get_shared_cache
+from precompute import precomputer, precompute_other_levels
+from prefetch import on_document, prefetch_stats, record_use, register_producer
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+class FastJSONProvider(DefaultJSONProvider):
+    """Serializes responses with orjson when it is installed"""
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        # response() always passes separators, which orjson's compact output already matches;
+        # pretty-printing (indent in debug mode), other options and unusual types use the standard encoder
+        if orjson is not None and set(kwargs) <= {"separators"}:
+            option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+            if self.sort_keys:
+                option |= orjson.OPT_SORT_KEYS
+            try:
+                # Flask's own default keeps dates and dataclasses serialized the way jsonify always has
+                return orjson.dumps(obj, default=self.default, option=option).decode("utf-8")
+            except TypeError:
+                pass
+        return super().dumps(obj, **kwargs)
+
 app = Flask(__name__)
+app.json = FastJSONProvider(app)
 CORS(app, resources={
     r"/api/*": {"origins": "*"},
     r"/update_timing": {"origins": "*"}
@@ -64,20 +94,41 @@ def get_config(user_level: str = "Basic") -> Dict[str, Any]:
         # Default to basic if unknown level
         return get_config("Basic")
 
-# Initialize Gemini
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-if not GEMINI_API_KEY:
-    raise ValueError("Missing Gemini API key")
-genai.configure(api_key=GEMINI_API_KEY)
-model = genai.GenerativeModel('gemini-1.5-flash')
+# Generated study content per document and level, shared with other workers and services
+artifacts = get_shared_cache()
+
+@app.before_request
+def begin_interactive_request():
+    # Background precomputation holds off while requests are being served
+    precomputer.begin_interactive()
+
+@app.teardown_request
+def end_interactive_request(exc):
+    precomputer.end_interactive()
+
+@app.after_request
+def compress_response(response):
+    """Compress large responses with brotli or gzip when the client accepts it"""
+    if (response.direct_passthrough or response.is_streamed
+            or 'Content-Encoding' in response.headers or response.status_code < 200):
+        return response
+    encoding = choose_encoding(request.headers.get('Accept-Encoding', ''))
+    if encoding is None:
+        return response
+    data = response.get_data()
+    if len(data) < COMPRESSION_MIN_SIZE:
+        return response
+    response.set_data(compress(data, encoding))
+    response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    return response
 
 def allowed_file(filename: str) -> bool:
     return '.' in filename and filename.lower().endswith('.pdf')
 
 def extract_text_from_pdf(pdf_path: str) -> str:
     try:
-        doc = fitz.open(pdf_path)
-        text = "\n".join([page.get_text("text") for page in doc])
+        text = read_pdf_text(pdf_path)
         if not text.strip():
             raise ValueError("PDF appears empty or is scanned")
         return text
@@ -269,7 +320,8 @@ Content to analyze:
     
     try:
         logger.info(f"Generating content for {user_level} level user")
-        response = model.generate_content(prompt)
+        # Not cached per prompt: a response that fails to parse must not be replayed
+        response = get_model().generate_content(prompt)
         parsed = parse_response(response.text)
         
         if not parsed['valid']:
@@ -319,6 +371,27 @@ Content to analyze:
             'status': 500
         }
 
+def get_content(text: str, doc_hash: str, user_level: str = "Basic") -> Dict[str, Any]:
+    """Return study content for a document and level, generating it only on a cache miss"""
+    key = artifact_key("study_content", doc_hash, user_level)
+    content = artifacts.get(key)
+    if content is None:
+        content = generate_content(text, user_level)
+        if content['status'] == 200:
+            artifacts.set(key, content)
+    return content
+
+def prefetch_study_content(text: str, doc_hash: str, user_level: str) -> bool:
+    """Speculatively generate study content for a document uploaded to another service"""
+    if artifact_key("study_content", doc_hash, user_level) in artifacts:
+        return False
+    content = get_content(text, doc_hash, user_level)
+    if content['status'] != 200:
+        raise RuntimeError(content.get('error', "Content generation failed"))
+    return True
+
+register_producer("study_content", prefetch_study_content)
+
 def calculate_adaptive_time(topic_name: str, user_level: str = "Basic") -> int:
     """Calculate suggested study time based on user level"""
     config = get_config(user_level)
@@ -388,6 +461,111 @@ class AdaptiveStudyScheduler:
             })
             self.current_time = break_end
 
+def compact_schedule(schedule: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Send each topic's content once and have schedule entries refer to it by topic_id"""
+    topics = {}
+    entries = []
+    for item in schedule:
+        topics[str(item['topic_id'])] = {
+            'topic': item['topic'],
+            'summary': item['summary'],
+            'qna': item['qna']
+        }
+        entries.append({
+            'topic_id': item['topic_id'],
+            'start_time': item['start_time'],
+            'end_time': item['end_time'],
+            'allocated_time': item['allocated_time'],
+            'completed': item['completed'],
+            # [type, start_time, end_time, duration]
+            'sessions': [
+                [s['type'], s['start_time'], s['end_time'], s['duration']]
+                for s in item['sessions']
+            ]
+        })
+    return {'topics': topics, 'schedule': entries}
+
+def prepare_topics(content: Dict[str, Any], user_level: str) -> List[Dict[str, Any]]:
+    """Prepare generated topics with standardized answers and adaptive timing"""
+    topics = []
+    for idx, topic in enumerate(content['topics'][:15], 1):
+        # Standardize the correct answer format
+        qna = []
+        for q in topic.get('mcqs', []):
+            correct = q['correct'][0].lower() if q['correct'] else 'a'
+            if correct not in ['a', 'b', 'c', 'd']:
+                correct = 'a'
+                
+            qna.append({
+                'question': q['question'],
+                'options': q['options'],
+                'correct': correct
+            })
+        
+        topics.append({
+            'id': idx,
+            'name': topic['topic'],
+            'summary': "\n".join(topic['summary']),
+            'qna': qna,
+            'suggested_time': calculate_adaptive_time(topic['topic'], user_level)
+        })
+    return topics
+
+def build_plan(
+    topics: List[Dict[str, Any]],
+    user_level: str,
+    warnings: List[str],
+    response_format: str = 'full'
+) -> Dict[str, Any]:
+    """Schedule topics from now on and build the plan returned to the frontend"""
+    # Generate adaptive schedule
+    scheduler = AdaptiveStudyScheduler(datetime.now(), user_level)
+    for topic in topics:
+        scheduler.add_topic(topic)
+    
+    # Filter out break items for frontend
+    final_schedule = [item for item in scheduler.schedule if item.get('topic_id')]
+    
+    logger.info(f"Generated {len(final_schedule)} topics for {user_level} level")
+    
+    result = {
+        "status": "success",
+        "schedule": final_schedule,
+        "metadata": {
+            "total_topics": len(topics),
+            "total_time": sum(
+                t['allocated_time'] 
+                for t in final_schedule
+            ),
+            "user_level": user_level,
+            "adaptive_features": {
+                "time_per_topic": f"{get_config(user_level)['MIN_TOPIC_TIME']}-{get_config(user_level)['MAX_TOPIC_TIME']} min",
+                "qna_time": f"{get_config(user_level)['QNA_TIME']} min",
+                "explanation_style": get_config(user_level)['EXPLANATION_DEPTH'],
+                "question_difficulty": get_config(user_level)['QUESTION_COMPLEXITY']
+            },
+            "warnings": warnings
+        }
+    }
+    if response_format == 'compact':
+        result.update(compact_schedule(final_schedule), format='compact')
+    return result
+
+def study_content_for_text(text: str, user_level: str) -> Dict[str, Any]:
+    """Generate (or fetch) study content for a document and queue related background work"""
+    doc_hash = document_fingerprint(text)
+    content = get_content(text, doc_hash, user_level)
+    
+    if content['status'] == 200:
+        record_use("study_content", doc_hash, user_level)
+        on_document("study_content", text, doc_hash, user_level)
+        precompute_other_levels(
+            "study_content", doc_hash, user_level,
+            lambda level: prefetch_study_content(text, doc_hash, level),
+            lambda level: artifact_key("study_content", doc_hash, level) not in artifacts
+        )
+    return content
+
 @app.route("/api/process", methods=["POST"])
 def process():
     try:
@@ -400,70 +578,21 @@ def process():
 
         # Get user level from form data (sent from frontend)
         user_level = request.form.get('userLevel', 'Basic')
+        # "compact" sends topic content once instead of inside every schedule entry
+        response_format = request.form.get('format', 'full')
         logger.info(f"Processing request for user level: {user_level}")
 
         with tempfile.NamedTemporaryFile(delete=False) as tmp:
             file.save(tmp.name)
             try:
                 text = extract_text_from_pdf(tmp.name)
-                content = generate_content(text, user_level)
+                content = study_content_for_text(text, user_level)
                 
                 if content['status'] != 200:
                     return jsonify(content), content['status']
                 
-                # Prepare topics with adaptive timing
-                topics = []
-                for idx, topic in enumerate(content['topics'][:15], 1):
-                    # Standardize the correct answer format
-                    qna = []
-                    for q in topic.get('mcqs', []):
-                        correct = q['correct'][0].lower() if q['correct'] else 'a'
-                        if correct not in ['a', 'b', 'c', 'd']:
-                            correct = 'a'
-                            
-                        qna.append({
-                            'question': q['question'],
-                            'options': q['options'],
-                            'correct': correct
-                        })
-                    
-                    topics.append({
-                        'id': idx,
-                        'name': topic['topic'],
-                        'summary': "\n".join(topic['summary']),
-                        'qna': qna,
-                        'suggested_time': calculate_adaptive_time(topic['topic'], user_level)
-                    })
-                
-                # Generate adaptive schedule
-                scheduler = AdaptiveStudyScheduler(datetime.now(), user_level)
-                for topic in topics:
-                    scheduler.add_topic(topic)
-                
-                # Filter out break items for frontend
-                final_schedule = [item for item in scheduler.schedule if item.get('topic_id')]
-                
-                logger.info(f"Generated {len(final_schedule)} topics for {user_level} level")
-                
-                return jsonify({
-                    "status": "success",
-                    "schedule": final_schedule,
-                    "metadata": {
-                        "total_topics": len(topics),
-                        "total_time": sum(
-                            t['allocated_time'] 
-                            for t in final_schedule
-                        ),
-                        "user_level": user_level,
-                        "adaptive_features": {
-                            "time_per_topic": f"{get_config(user_level)['MIN_TOPIC_TIME']}-{get_config(user_level)['MAX_TOPIC_TIME']} min",
-                            "qna_time": f"{get_config(user_level)['QNA_TIME']} min",
-                            "explanation_style": get_config(user_level)['EXPLANATION_DEPTH'],
-                            "question_difficulty": get_config(user_level)['QUESTION_COMPLEXITY']
-                        },
-                        "warnings": content.get('warnings', [])
-                    }
-                })
+                topics = prepare_topics(content, user_level)
+                return jsonify(build_plan(topics, user_level, content.get('warnings', []), response_format))
                 
             except Exception as e:
                 logger.error(f"Processing error: {e}")
@@ -477,6 +606,61 @@ def process():
         logger.error(f"Unexpected error: {e}")
         return jsonify({"error": "Internal server error"}), 500
 
+def plan_for_pdf(filename: str, data: bytes, user_level: str, response_format: str) -> Dict[str, Any]:
+    """Build the study plan for one file of a batch"""
+    if not allowed_file(filename):
+        raise ValueError("Invalid file")
+    text = read_pdf_bytes(data)
+    if not text.strip():
+        raise ValueError("PDF appears empty or is scanned")
+    
+    content = study_content_for_text(text, user_level)
+    if content['status'] != 200:
+        raise ValueError(content.get('error', "Content generation failed"))
+    
+    topics = prepare_topics(content, user_level)
+    # Topics are kept for merging under a private key, removed before the record is sent
+    return {**build_plan(topics, user_level, content.get('warnings', []), response_format), "_merge_topics": topics}
+
+@app.route("/api/process/batch", methods=["POST"])
+def process_batch():
+    files = [f for f in request.files.getlist('pdf') if f and f.filename]
+    if not files:
+        return jsonify({"error": "No file uploaded"}), 400
+    if len(files) > BATCH_MAX_FILES:
+        return jsonify({"error": f"At most {BATCH_MAX_FILES} files per batch"}), 400
+    
+    user_level = request.form.get('userLevel', 'Basic')
+    response_format = request.form.get('format', 'full')
+    # Optionally chain every file's topics into one continuous plan, in upload order
+    merge = request.form.get('merge', 'false').lower() in ('1', 'true', 'yes')
+    uploads = [(f.filename, f.read()) for f in files]
+    logger.info(f"Processing batch of {len(uploads)} files for user level: {user_level}")
+    
+    def records():
+        topics_by_file = {}
+        for record in iter_batch(uploads, partial(plan_for_pdf, user_level=user_level, response_format=response_format)):
+            topics = record.pop('_merge_topics', None)
+            if topics:
+                topics_by_file[record['index']] = topics
+            yield ndjson(record)
+        
+        if merge and topics_by_file:
+            merged_topics = [t for index in sorted(topics_by_file) for t in topics_by_file[index]]
+            yield ndjson({"type": "merged", **build_plan(merged_topics, user_level, [], response_format)})
+        yield ndjson({"type": "done", "total_files": len(uploads)})
+    
+    return Response(records(), mimetype="application/x-ndjson")
+
+@app.route("/ready", methods=["GET"])
+def readiness_check():
+    status = readiness_status()
+    return jsonify(status), 200 if status["ready"] else 503
+
+@app.route("/api/prefetch/stats", methods=["GET"])
+def get_prefetch_stats():
+    return jsonify(prefetch_stats())
+
 @app.route("/api/update_timing", methods=["POST"])
 def update_timing():
     try:
@@ -504,6 +688,9 @@ def update_timing():
         logger.error(f"Update timing error: {str(e)}")
         return jsonify({"error": "Internal server error"}), 500
 
+# Load the extractor and model client in the background; /ready reports when done
+start_warm_up()
+
 if __name__ == "__main__":
     if os.name == 'nt':
         tempfile.tempdir = os.path.expanduser("~\\temp")
@@ -0,0 +1,43 @@
+import json
+from mcq_stream import MCQStreamParser
+
+QUESTIONS = [
+    {"question": "What is the capital of France?", "options": ["London", "Paris", "Berlin", "Madrid"], "answer": "Paris"},
+    {"question": "Which brace closes an object: { or }?", "options": ["{", "}"], "answer": "}"},
+    {"question": 'Who said "to be, or not to be"?', "options": ["Hamlet", "Macbeth"], "answer": "Hamlet"},
+]
+
+def feed_in_chunks(text, size):
+    parser = MCQStreamParser()
+    found = []
+    for i in range(0, len(text), size):
+        found += parser.feed(text[i:i + size])
+    return found
+
+def test_whole_response_in_one_chunk():
+    assert feed_in_chunks(json.dumps({"questions": QUESTIONS}), 10_000) == QUESTIONS
+
+def test_every_chunk_boundary():
+    text = json.dumps({"questions": QUESTIONS}, indent=2)
+    for size in range(1, 40):
+        assert feed_in_chunks(text, size) == QUESTIONS
+
+def test_question_is_returned_as_soon_as_it_closes():
+    text = json.dumps({"questions": QUESTIONS})
+    first_end = text.index(json.dumps(QUESTIONS[0])) + len(json.dumps(QUESTIONS[0]))
+    parser = MCQStreamParser()
+    assert parser.feed(text[:first_end - 1]) == []
+    assert parser.feed(text[first_end - 1:first_end]) == [QUESTIONS[0]]
+
+def test_braces_and_escaped_quotes_inside_strings():
+    question = {"question": 'Escape \\" then } and { inside', "options": ["a\\", "{b}"], "answer": "a\\"}
+    assert feed_in_chunks(json.dumps([question]), 3) == [question]
+
+def test_code_fence_around_the_response():
+    text = "```json\n" + json.dumps({"questions": QUESTIONS[:1]}) + "\n```"
+    assert feed_in_chunks(text, 7) == QUESTIONS[:1]
+
+def test_incomplete_and_invalid_objects_are_skipped():
+    text = json.dumps({"questions": [{"question": "", "options": ["a", "b"], "answer": "a"}, {"options": ["a"]}, QUESTIONS[0]]})
+    assert feed_in_chunks(text, 5) == [QUESTIONS[0]]
+    assert MCQStreamParser().feed(json.dumps(QUESTIONS[0])[:-1]) == []